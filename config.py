@@ -21,6 +21,18 @@ if required_channel_id_str:
         logging.getLogger(__name__).error(f"Не удалось распарсить REQUIRED_CHANNEL_ID из переменной окружения: {required_channel_id_str}. Убедитесь, что это число.")
 
 
+# --- Настройки кэша ---
+# Если REDIS_URL задан, кэш результатов дублируется в Redis: перезапуск бота
+# не сбрасывает его, а несколько воркеров с одним токеном делят общие записи.
+REDIS_URL = os.getenv("REDIS_URL")
+
+# --- Настройки вебхука ---
+# Если WEBHOOK_URL задан, бот принимает обновления по вебхуку (Telegram сам
+# пушит их без задержки long polling). Если не задан — используется long polling.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg")
+WEBHOOK_PORT = int(os.getenv("PORT", "8080"))
+
 # --- Настройка логирования ---
 logging.basicConfig(
     level=logging.INFO, # Уровень логирования: INFO, DEBUG, WARNING, ERROR, CRITICAL
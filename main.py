@@ -1,16 +1,25 @@
 import asyncio
+import html
+import json
 from typing import Dict, List, Optional
-from datetime import datetime
 
+import redis.asyncio as redis
+
+import aiohttp
+import uvloop
+from aiohttp import web
 from aiogram import Bot, Dispatcher, F
+from cachetools import TTLCache
 from aiogram.filters import Command
 from aiogram.types import Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiolimiter import AsyncLimiter
 
 # Импортируем конфигурацию
-from config import BOT_TOKEN, REQUIRED_CHANNEL_ID, logger
+from config import BOT_TOKEN, REDIS_URL, REQUIRED_CHANNEL_ID, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_PORT, logger
 
 # Импорт утилит
-from utils import normalize_text
+from utils import close_session, get_session, normalize_and_clean, normalize_text
 
 from parsers.hausdorf import parse_hausdorf
 from parsers.mieles import parse_mieles
@@ -21,9 +30,88 @@ from parsers.tehnikapremium import parse_tehnikapremium
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
-# Кэширование результатов
-cache: Dict[str, List[Dict]] = {} 
-last_cache_clear_date: Optional[datetime] = None
+# Сайты конкурентов и их парсеры (порядок определяет порядок в ответе)
+COMPETITOR_SITES = [
+    ("Mieles.ru", parse_mieles),
+    ("Hausdorf.ru", parse_hausdorf),
+    ("Miele-Unique.ru", parse_miele_unique),
+]
+
+# Кэширование результатов: ограниченный по размеру кэш с автоматическим
+# истечением записей через сутки (вместо ручной очистки раз в день)
+cache: TTLCache = TTLCache(maxsize=10_000, ttl=86400)
+
+# Необязательный Redis-слой поверх кэша в памяти: переживает перезапуски
+# бота и делится между несколькими воркерами с одним токеном
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+_CACHE_TTL = 86400
+
+async def cache_get(key: str) -> Optional[List[Dict]]:
+    """Читает запись кэша: сперва память, затем Redis (если настроен)."""
+    value = cache.get(key)
+    if value is not None or redis_client is None:
+        return value
+    try:
+        raw = await redis_client.get(key)
+    except Exception as e:
+        logger.error(f"Ошибка чтения из Redis (ключ {key}): {e}")
+        return None
+    if raw is None:
+        return None
+    try:
+        value = json.loads(raw)
+    except ValueError as e:
+        # Битая/устаревшая запись в Redis — деградируем до промаха кэша,
+        # как и при любой другой ошибке Redis, а не роняем обработчик
+        logger.error(f"Некорректный JSON в Redis (ключ {key}): {e}")
+        return None
+    cache[key] = value  # пополняем кэш в памяти
+    return value
+
+async def cache_set(key: str, value: List[Dict]) -> None:
+    """Сохраняет запись кэша в память и в Redis (если настроен)."""
+    cache[key] = value
+    if redis_client is not None:
+        try:
+            await redis_client.set(key, json.dumps(value), ex=_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Ошибка записи в Redis (ключ {key}): {e}")
+
+# Коалесцирование одинаковых одновременных запросов ("single-flight"):
+# первый запрос выполняет скрейп, дубликаты ждут тот же Future
+_inflight: Dict[str, "asyncio.Future[List[Dict]]"] = {}
+
+def make_key(site: str, query: str, original: str = "") -> str:
+    """
+    Составной ключ кэша: сайт + нормализованный запрос (+ название товара).
+    Позволяет кэшировать результаты каждого парсера независимо,
+    а не только ответ TehnikaPremium.
+    """
+    return "||".join(filter(None, [site, normalize_text(query), normalize_text(original)]))
+
+# Глобальный лимит Telegram — 30 сообщений/с на бота; держим небольшой запас,
+# чтобы всплески нагрузки вставали в очередь вместо ошибок 429 и ретраев
+TG_LIMITER = AsyncLimiter(28, 1)
+
+async def safe_answer(message: Message, *args, **kwargs):
+    """Отправляет ответ с учетом глобального лимита исходящих сообщений."""
+    async with TG_LIMITER:
+        return await message.answer(*args, **kwargs)
+
+def format_price(price) -> str:
+    """Форматирует цену с пробелами между разрядами, либо 'нет данных'."""
+    if isinstance(price, (int, float)):
+        return f"{price:,.0f}".replace(',', ' ') + " руб."
+    return 'нет данных'
+
+# Общая HTTP-сессия для всех парсеров (инициализируется в main(), закрывается при остановке)
+http_session: Optional[aiohttp.ClientSession] = None
+
+# Кэш проверки подписки на канал: один вызов get_chat_member на пользователя
+# в 5 минут вместо запроса к Bot API на каждое сообщение. Отрицательный
+# результат кэшируем коротко, чтобы новый подписчик не ждал доступа 5 минут.
+_sub_cache: TTLCache = TTLCache(maxsize=100_000, ttl=300)
+_sub_negative_cache: TTLCache = TTLCache(maxsize=100_000, ttl=30)
 
 # --- Вспомогательная функция для проверки подписки на канал ---
 async def is_user_subscribed_to_required_channel(user_id: int) -> bool:
@@ -34,7 +122,13 @@ async def is_user_subscribed_to_required_channel(user_id: int) -> bool:
     if not REQUIRED_CHANNEL_ID: # Если REQUIRED_CHANNEL_ID не установлен, считаем, что проверка не нужна
         logger.warning("REQUIRED_CHANNEL_ID не установлен в config.py. Проверка подписки на канал отключена.")
         return True # Разрешаем доступ, если канал не указан
-        
+
+    # Сначала смотрим в кэш, чтобы не ходить в Bot API на каждое сообщение
+    if user_id in _sub_cache:
+        return True
+    if user_id in _sub_negative_cache:
+        return False
+
     try:
         # Получаем информацию о членстве пользователя в канале
         chat_member = await bot.get_chat_member(chat_id=REQUIRED_CHANNEL_ID, user_id=user_id)
@@ -43,7 +137,10 @@ async def is_user_subscribed_to_required_channel(user_id: int) -> bool:
         # 'member', 'administrator', 'creator', 'restricted' - это активные подписчики/участники
         is_subscribed = chat_member.status in ['member', 'administrator', 'creator', 'restricted']
             
-        if not is_subscribed:
+        if is_subscribed:
+            _sub_cache[user_id] = True
+        else:
+            _sub_negative_cache[user_id] = True
             logger.info(f"Пользователь {user_id} (статус: {chat_member.status}) не является подписчиком канала {REQUIRED_CHANNEL_ID}.")
         return is_subscribed
     except Exception as e:
@@ -59,10 +156,10 @@ async def is_user_subscribed_to_required_channel(user_id: int) -> bool:
 async def start_command(message: Message):
     # Проверяем подписку на канал
     if not await is_user_subscribed_to_required_channel(message.from_user.id):
-        await message.answer("🚫 Для использования бота вы должны быть подписчиком нашего приватного канала. Пожалуйста, подпишитесь на него, чтобы получить доступ.")
+        await safe_answer(message, "🚫 Для использования бота вы должны быть подписчиком нашего приватного канала. Пожалуйста, подпишитесь на него, чтобы получить доступ.")
         return
     
-    await message.answer(
+    await safe_answer(message, 
         "🔍 Привет! Я бот для сравнения цен на Miele.\n\n"
         "Просто отправь мне название или артикул товара, например:\n"
         "<code>WWR880WPS</code> или <code>Стиральная машина</code>\n\n"
@@ -76,136 +173,220 @@ async def start_command(message: Message):
 
 @dp.message(F.text, F.chat.type == 'private') # <-- Используем строковое значение 'private'
 async def handle_product_request(message: Message):
-    global last_cache_clear_date, cache
-
     # Проверка подписки на канал
     if not await is_user_subscribed_to_required_channel(message.from_user.id):
-        await message.answer("🚫 Для использования бота вы должны быть подписчиком нашего приватного канала. Пожалуйста, подпишитесь на него, чтобы получить доступ.")
+        await safe_answer(message, "🚫 Для использования бота вы должны быть подписчиком нашего приватного канала. Пожалуйста, подпишитесь на него, чтобы получить доступ.")
         return
 
-    # Проверяем и очищаем кэш, если день изменился
-    current_date = datetime.now().date()
-    if last_cache_clear_date is None or current_date > last_cache_clear_date.date():
-        logger.info(f"Очистка кэша: предыдущая дата {last_cache_clear_date.date() if last_cache_clear_date else 'N/A'}, текущая дата {current_date}")
-        cache.clear()
-        last_cache_clear_date = datetime.now() # Обновляем время последней очистки до текущего момента
-        logger.info("Кэш успешно очищен.")
-
     # Если вы оставили ALLOWED_USER_IDS, можно добавить здесь дополнительную проверку
     pass
 
     user_query = message.text.strip()
     if len(user_query) < 3:
-        await message.answer("❌ Слишком короткий запрос. Минимум 3 символа.")
+        await safe_answer(message, "❌ Слишком короткий запрос. Минимум 3 символа.")
         return
 
     cache_key = normalize_text(user_query)
-    
+    # Нормализуем запрос один раз и передаем его во все парсеры той же
+    # функцией, которой они чистят названия товаров (normalize_and_clean):
+    # старая цепочка remove_miele(normalize_text(...)) расходится с ней
+    # на склеенных пунктуацией формах ('Miele-G7310' -> 'mieleg7310'
+    # вместо 'g7310'), из-за чего оценка релевантности молча промахивалась
+    clean_query = normalize_and_clean(user_query)
+
+
     main_product_data = None
-    if cache_key in cache and cache[cache_key]:
-        main_product_data = cache[cache_key][0]
+    cached_results = await cache_get(cache_key)
+    if cached_results:
+        main_product_data = cached_results[0]
         logger.info(f"Использую кэшированные данные для TehnikaPremium.ru: {main_product_data['title']}")
-    
+
+    speculative_tasks = None
     if not main_product_data:
         await bot.send_chat_action(message.chat.id, "typing")
-        
-        tehnikapremium_results = await parse_tehnikapremium(f'Miele {user_query}') 
-        
-        if not tehnikapremium_results:
-            tehnikapremium_results = [{
-                'title': cache_key,
-                'link': '',
-                'price': '',
-                'article': ''
-            }]
-        
+
+        if cache_key in _inflight:
+            # Такой же запрос уже скрейпится — ждем его результат,
+            # не создавая дублирующий запрос к сайту
+            tehnikapremium_results = await _inflight[cache_key]
+        else:
+            fut: asyncio.Future = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = fut
+
+            # Спекулятивно запускаем конкурентов параллельно с TehnikaPremium:
+            # их HTTP-запрос зависит только от user_query, а уточненное название
+            # влияет лишь на оценку релевантности. Две сетевые фазы схлопываются в одну.
+            speculative_tasks = [
+                asyncio.create_task(parser(
+                    user_query, user_query, http_session,
+                    clean_original_title=clean_query, clean_search_query=clean_query,
+                ))
+                for _, parser in COMPETITOR_SITES
+            ]
+
+            try:
+                tehnikapremium_results = await parse_tehnikapremium(
+                    f'Miele {user_query}', http_session, clean_search_query=clean_query
+                )
+
+                if not tehnikapremium_results:
+                    tehnikapremium_results = [{
+                        'title': cache_key,
+                        'link': '',
+                        'price': '',
+                        'article': ''
+                    }]
+
+                await cache_set(cache_key, tehnikapremium_results)
+                fut.set_result(tehnikapremium_results)
+            except BaseException as e:
+                fut.set_exception(e)
+                raise
+            finally:
+                del _inflight[cache_key]
+
         main_product_data = tehnikapremium_results[0]
-        cache[cache_key] = tehnikapremium_results
-        
+
         logger.info(f"На TehnikaPremium.ru найден основной товар: {main_product_data['title']} ({main_product_data['article']}) - {main_product_data['price']} RUB")
 
     original_title_for_competitors = main_product_data['title']
-    article_tehnikapremium = main_product_data['article'] 
-    
-    price_tehnikapremium = main_product_data['price']
-    if isinstance(price_tehnikapremium, (int, float)):
-        formatted_price_tehnikapremium = f"{price_tehnikapremium:,.0f}".replace(',', ' ')
-    else:
-        formatted_price_tehnikapremium = 'нет данных'
-
+    clean_title_for_competitors = normalize_and_clean(original_title_for_competitors)
+    article_tehnikapremium = main_product_data['article']
+    formatted_price_tehnikapremium = format_price(main_product_data['price'])
     link_tehnikapremium = main_product_data['link']
 
     await bot.send_chat_action(message.chat.id, "typing")
-    competitor_tasks = []
-    
-    competitor_tasks.append(parse_mieles(original_title_for_competitors, user_query))
-    competitor_tasks.append(parse_hausdorf(original_title_for_competitors, user_query))
-    competitor_tasks.append(parse_miele_unique(original_title_for_competitors, user_query))
 
-    try:
-        competitor_results = await asyncio.gather(*competitor_tasks, return_exceptions=True)
-    except Exception as e:
-        logger.error(f"Error during competitor parsing: {e}", exc_info=True)
-        await message.answer("⚠️ Произошла ошибка при получении данных конкурентов.")
-        return
+    competitor_results: List = [None] * len(COMPETITOR_SITES)
+
+    if speculative_tasks is not None:
+        # Дожидаемся спекулятивного прогрева. Если уточненное название совпало
+        # с запросом пользователя — это и есть финальные результаты; иначе они
+        # как минимум прогрели HTTP-кэш, и повторный проход почти бесплатен.
+        speculative_results = await asyncio.gather(*speculative_tasks, return_exceptions=True)
+        for (site_name, _), result in zip(COMPETITOR_SITES, speculative_results):
+            # Пустой список не кэшируем: парсеры возвращают [] и при сетевой
+            # ошибке, и сутки показывать "не найдено" из-за одного таймаута
+            # нельзя — пусть следующий запрос скрейпит заново
+            if not isinstance(result, Exception) and result:
+                # Ключ должен совпадать с трехчастным ключом чтения ниже:
+                # спекулятивный проход делался с original_title == user_query,
+                # поэтому запись достижима ровно тогда, когда уточненное
+                # название нормализуется в сам запрос
+                await cache_set(make_key(site_name, user_query, user_query), result)
+        if normalize_text(original_title_for_competitors) == cache_key:
+            competitor_results = list(speculative_results)
+
+    # Результаты каждого сайта кэшируются независимо по составному ключу,
+    # поэтому запрашиваем только те сайты, которых нет в кэше
+    pending = []  # (индекс в competitor_results, ключ кэша)
+    pending_tasks = []
+    for i, (site_name, parser) in enumerate(COMPETITOR_SITES):
+        if competitor_results[i] is not None:
+            continue
+        site_key = make_key(site_name, user_query, original_title_for_competitors)
+        cached_result = await cache_get(site_key)
+        if cached_result is not None:
+            logger.info(f"Использую кэшированные данные для {site_name}")
+            competitor_results[i] = cached_result
+        else:
+            pending.append((i, site_key))
+            pending_tasks.append(parser(
+                original_title_for_competitors, user_query, http_session,
+                clean_original_title=clean_title_for_competitors,
+                clean_search_query=clean_query,
+            ))
+
+    if pending_tasks:
+        try:
+            fetched = await asyncio.gather(*pending_tasks, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"Error during competitor parsing: {e}", exc_info=True)
+            await safe_answer(message, "⚠️ Произошла ошибка при получении данных конкурентов.")
+            return
+
+        for (i, site_key), result in zip(pending, fetched):
+            competitor_results[i] = result
+            # Пустые результаты не кэшируем по той же причине, что и выше:
+            # [] неотличим от сбоя fetch внутри парсера
+            if not isinstance(result, Exception) and result:
+                await cache_set(site_key, result)
 
     response_parts = [
-        f"<b>{original_title_for_competitors}</b> <a href='{link_tehnikapremium}'>({article_tehnikapremium})</a>\n",
-        f"🏷️ <b>TehnikaPremium.ru</b>: {formatted_price_tehnikapremium} руб.\n"
+        f"<b>{html.escape(original_title_for_competitors)}</b> <a href='{html.escape(link_tehnikapremium)}'>({html.escape(article_tehnikapremium)})</a>\n",
+        f"🏷️ <b>TehnikaPremium.ru</b>: {formatted_price_tehnikapremium}\n"
     ]
-    
+
     response_parts.append("\nЦены конкурентов:")
 
-    site_names = ["Mieles.ru", "Hausdorf.ru", "Miele-Unique.ru"]
-    
     for i, result_list_or_exception in enumerate(competitor_results):
-        site_name = site_names[i]
+        site_name = COMPETITOR_SITES[i][0]
         
         if isinstance(result_list_or_exception, Exception):
             logger.error(f"Ошибка парсинга {site_name}: {result_list_or_exception}")
             response_parts.append(f"• {site_name}: ❌ Ошибка ({result_list_or_exception.__class__.__name__})")
         elif result_list_or_exception:
             response_parts.append(f"• <b>{site_name}</b>:")
-            for item in result_list_or_exception:
-                title = item.get('title', 'Название неизвестно')
-                link = item.get('link', '#')
-                price = item.get('price', None) 
-                
-                formatted_price = 'нет данных'
-                if isinstance(price, (int, float)):
-                    formatted_price = f"{price:,.0f}".replace(',', ' ') + " руб." 
-                else:
-                    formatted_price = 'нет данных' 
-
-                response_parts.append(f"  - <a href='{link}'>{title}</a>: {formatted_price}")
+            # html.escape защищает от ошибок parse_mode при спецсимволах в данных сайтов
+            response_parts.extend(
+                f"  - <a href='{html.escape(item.get('link', '#'))}'>"
+                f"{html.escape(item.get('title', 'Название неизвестно'))}</a>: "
+                f"{format_price(item.get('price'))}"
+                for item in result_list_or_exception
+            )
         else:
             response_parts.append(f"• {site_name}: ❌ не найдено")
 
     final_response = "\n".join(response_parts)
     
-    await message.answer(final_response, parse_mode="HTML", disable_web_page_preview=True)
+    await safe_answer(message, final_response, parse_mode="HTML", disable_web_page_preview=True)
 
 # --- Main entry point ---
 
 async def main():
-    # Инициализируем last_cache_clear_date при запуске бота
-    global last_cache_clear_date
-    last_cache_clear_date = datetime.now() 
-    logger.info(f"Кэш инициализирован. Дата последней очистки: {last_cache_clear_date.date()}")
+    global http_session
+
+    # Одна HTTP-сессия на весь процесс: пул соединений и DNS-кэш
+    # переиспользуются всеми парсерами вместо рукопожатия на каждый запрос.
+    # get_session() создает ее лениво внутри работающего event loop.
+    http_session = get_session()
 
     try:
-        logger.info("Удаляем предыдущие вебхуки...")
-        await bot.delete_webhook(drop_pending_updates=True) 
-        logger.info("Вебхуки удалены. Запускаем бота через long polling...")
-        await dp.start_polling(bot)
+        if WEBHOOK_URL:
+            # Режим вебхука: Telegram пушит обновления напрямую,
+            # без задержки цикла getUpdates
+            webhook_url = f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}"
+            logger.info(f"Запускаем бота в режиме вебхука: {webhook_url}")
+            app = web.Application()
+            SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=WEBHOOK_PATH)
+            setup_application(app, dp, bot=bot)
+            await bot.set_webhook(url=webhook_url, drop_pending_updates=True)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, host="0.0.0.0", port=WEBHOOK_PORT).start()
+            # Держим процесс живым, пока его не остановят
+            await asyncio.Event().wait()
+        else:
+            # Резервный режим: long polling (по умолчанию, если WEBHOOK_URL не задан)
+            logger.info("Удаляем предыдущие вебхуки...")
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Вебхуки удалены. Запускаем бота через long polling...")
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     finally:
+        if redis_client is not None:
+            await redis_client.aclose()
+            logger.info("Redis connection closed")
+        await close_session()
+        logger.info("HTTP session closed")
         if bot and bot.session:
             await bot.session.close()
             logger.info("Bot session closed")
 
 if __name__ == "__main__":
+    # uvloop заметно ускоряет asyncio I/O — именно из него состоит вся нагрузка бота
+    uvloop.install()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,20 +1,53 @@
 import aiohttp
-import json
-import time
+import heapq
+import orjson
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
-import urllib.parse
 
-# Предполагаем, что utils.py с normalize_text, remove_miele существует
+# Предполагаем, что utils.py с normalize_and_clean существует
 # (fetch не нужен, так как здесь прямой API вызов через aiohttp.ClientSession)
-from utils import normalize_text, remove_miele 
+from utils import HTTP_TIMEOUT, get_session, host_semaphore, normalize_and_clean
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Логирование настраивается один раз в config.py при старте бота
 logger = logging.getLogger(__name__)
 
-async def parse_mieles(original_title: str, search_query: str) -> List[Dict]:
+# Запасной шаблон для извлечения JSON-тела из "грязного" ответа API;
+# компилируется один раз при импорте, а не при каждом неудачном разборе
+_JSON_BODY = re.compile(r'({.*})', re.DOTALL)
+
+# Статичные части запроса к Tilda API вынесены на уровень модуля:
+# между вызовами меняется только поисковый запрос, а кодированием URL
+# занимается сам aiohttp через params=
+_TILDA_URL = "https://store.tildaapi.com/api/getproductslist/"
+_TILDA_STATIC_PARAMS = {
+    "storepartuid": "118745354213",
+    "recid": "501398769",
+    "slice": "1",
+    "size": "52",
+}
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Referer": "https://mieles.ru/",
+    "Origin": "https://mieles.ru",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "cross-site",
+    "Pragma": "no-cache",
+    "Cache-Control": "no-cache",
+    "X-Requested-With": "XMLHttpRequest"
+}
+
+async def parse_mieles(
+    original_title: str,
+    search_query: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    clean_original_title: Optional[str] = None,
+    clean_search_query: Optional[str] = None,
+) -> List[Dict]:
     """
     Парсинг mieles.ru через API с поиском по обоим запросам (original_title и search_query)
     и возвратом наиболее релевантных уникальных позиций.
@@ -22,147 +55,157 @@ async def parse_mieles(original_title: str, search_query: str) -> List[Dict]:
     Args:
         original_title (str): Исходное, более полное название товара.
         search_query (str): Сокращенный или основной поисковый запрос.
+        session (Optional[aiohttp.ClientSession]): Общая HTTP-сессия;
+            если не передана, берется ленивая сессия процесса (get_session()).
+        clean_original_title (Optional[str]): Уже нормализованное название (опционально).
+        clean_search_query (Optional[str]): Уже нормализованный запрос (опционально).
 
     Returns:
         List[Dict]: Список из 3 наиболее релевантных уникальных объектов, каждый со словарями:
                     {'title': str, 'link': str, 'price': float}.
     """
-    c = int(time.time() * 1000) # Текущее время в миллисекундах для параметра c
-    url = (
-        f"https://store.tildaapi.com/api/getproductslist/"
-        f"?storepartuid=118745354213"
-        f"&recid=501398769"
-        f"&c={c}"
-        f"&slice=1"
-        f"&filters%5Bquery%5D%5B0%5D={urllib.parse.quote_plus(search_query)}"
-        f"&size=52"
-    )
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Referer": "https://mieles.ru/",
-        "Origin": "https://mieles.ru",
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "cross-site",
-        "Pragma": "no-cache",
-        "Cache-Control": "no-cache",
-        "X-Requested-With": "XMLHttpRequest"
+    if session is None:
+        session = get_session()
+
+    # Без антикэш-параметра: уникальный URL на каждый вызов превращал бы
+    # общий SQLite HTTP-кэш в свалку никогда не читаемых записей. Стабильный
+    # URL дает повторным запросам те же кэш-хиты (и тот же TTL), что и у
+    # HTML-магазинов; свежесть на стороне CDN просят заголовки no-cache.
+    params = {
+        **_TILDA_STATIC_PARAMS,
+        "filters[query][0]": search_query,
     }
-    
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, headers=headers, timeout=10) as response:
-                response.raise_for_status() # Вызовет исключение для статусов 4xx/5xx
-                response_text = await response.text()
-                
-                try:
-                    data = json.loads(response_text)
-                except json.JSONDecodeError:
-                    json_match = re.search(r'({.*})', response_text, re.DOTALL)
-                    if json_match:
-                        try:
-                            data = json.loads(json_match.group(1))
-                        except json.JSONDecodeError:
-                            logger.error("Не удалось извлечь JSON из ответа mieles.ru")
-                            return []
-                    else:
-                        logger.error("Ответ mieles.ru не содержит валидный JSON")
+
+    try:
+        # Тот же пер-хостовый лимит, что и в utils.fetch, но для прямого API-вызова
+        async with host_semaphore(_TILDA_URL), session.get(
+            _TILDA_URL, params=params, headers=_HEADERS, timeout=HTTP_TIMEOUT
+        ) as response:
+            response.raise_for_status() # Вызовет исключение для статусов 4xx/5xx
+            # orjson разбирает байты напрямую — без промежуточной str
+            # и в разы быстрее стандартного json на ~100-товарном ответе
+            response_body = await response.read()
+
+            try:
+                data = orjson.loads(response_body)
+            except orjson.JSONDecodeError:
+                json_match = _JSON_BODY.search(response_body.decode('utf-8', 'replace'))
+                if json_match:
+                    try:
+                        data = orjson.loads(json_match.group(1))
+                    except orjson.JSONDecodeError:
+                        logger.error("Не удалось извлечь JSON из ответа mieles.ru")
                         return []
-                
-                # Нормализуем оба поисковых запроса
-                clean_original_title = remove_miele(normalize_text(original_title))
-                clean_search_query = remove_miele(normalize_text(search_query))
-
-                # Если оба запроса пустые, нет смысла продолжать
-                if not clean_original_title and not clean_search_query:
-                    logger.warning("Оба поисковых запроса пусты после нормализации.")
+                else:
+                    logger.error("Ответ mieles.ru не содержит валидный JSON")
                     return []
 
-                found_products = [] 
-                seen_links = set() # Множество для отслеживания уникальных ссылок
-                
-                for item in data.get("products", []):
-                    item_title = item.get("title", "")
-                    item_link = item.get("url", "")
-                    item_price = item.get("price")
+            # Нормализуем запросы, если вызывающий код не передал готовые значения
+            if clean_original_title is None:
+                clean_original_title = normalize_and_clean(original_title)
+            if clean_search_query is None:
+                clean_search_query = normalize_and_clean(search_query)
+
+            # Если оба запроса пустые, нет смысла продолжать
+            if not clean_original_title and not clean_search_query:
+                logger.warning("Оба поисковых запроса пусты после нормализации.")
+                return []
+
+            # Токены запросов считаются один раз до цикла; проверка
+            # "все слова присутствуют" становится issubset по множеству токенов
+            # названия — O(N + W) хеширования вместо сканирования подстрок,
+            # и вдобавок со словарной семантикой ('cm' больше не совпадает с 'cm7')
+            has_orig = bool(clean_original_title)
+            has_query = bool(clean_search_query)
+            original_title_words = frozenset(clean_original_title.split()) if has_orig else None
+            search_query_words = frozenset(clean_search_query.split()) if has_query else None
+
+            # Куча из максимум 3 элементов (оценка со знаком минус, как в
+            # парсере hausdorf): min-heap вытесняет худшего кандидата
+            top_heap = []
+            seen_links = set() # Множество для отслеживания уникальных ссылок
+
+            # Локальные псевдонимы горячих имен: LOAD_FAST вместо
+            # LOAD_GLOBAL/LOAD_ATTR на каждой итерации цикла по товарам
+            _norm_clean = normalize_and_clean
+            _seen_add = seen_links.add
+            _heappush = heapq.heappush
+            _heapreplace = heapq.heapreplace
+
+            for item in data.get("products", []):
+                item_title = item.get("title", "")
+                item_link = item.get("url", "")
+                item_price = item.get("price")
 
-                    if not item_title or not item_link or item_price is None:
-                        continue # Пропускаем неполные данные
+                if not item_title or not item_link or item_price is None:
+                    continue # Пропускаем неполные данные
 
-                    # Нормализуем название товара из API
-                    clean_item_title = remove_miele(normalize_text(item_title))
+                # Нормализуем название товара из API
+                clean_item_title = _norm_clean(item_title)
 
-                    # Проверяем уникальность ссылки
-                    if item_link in seen_links:
-                        logger.debug(f"Пропускаем дубликат ссылки: {item_link}")
+                # Проверяем уникальность ссылки
+                if item_link in seen_links:
+                    logger.debug("Пропускаем дубликат ссылки: %s", item_link)
+                    continue
+
+                # Оценка релевантности: критерии от сильного к слабому, итоговый
+                # балл — позиция первого сработавшего. Кортеж флагов заменяет
+                # прежний каскад if/elif с min() и двойными проверками `in`.
+                title_tokens = set(clean_item_title.split())
+                flags = (
+                    has_orig and clean_original_title == clean_item_title,
+                    has_query and clean_search_query == clean_item_title,
+                    has_orig and clean_original_title in clean_item_title,
+                    has_query and clean_search_query in clean_item_title,
+                    original_title_words is not None and original_title_words.issubset(title_tokens),
+                    search_query_words is not None and search_query_words.issubset(title_tokens),
+                )
+                score = next((i for i, f in enumerate(flags) if f), None)
+
+                # Если хоть какой-то критерий сработал
+                if score is not None:
+                    # Добавляем длину названия как множитель для дополнительной сортировки
+                    relevance_score = score + len(clean_item_title) * 0.01
+
+                    try:
+                        price = float(item_price)
+                    except ValueError:
+                        logger.error("Ошибка преобразования цены '%s' для товара '%s'", item_price, item_title)
                         continue
-                    
-                    relevance_score = float('inf') # Начинаем с очень большого значения, чем меньше, тем лучше
-                    
-                    # Оценка релевантности
-                    # 1. Точное совпадение с original_title
-                    if clean_original_title and clean_original_title == clean_item_title:
-                        relevance_score = min(relevance_score, 0)
-                    # 2. Точное совпадение с search_query
-                    elif clean_search_query and clean_search_query == clean_item_title:
-                        relevance_score = min(relevance_score, 1)
-
-                    # 3. Совпадение как подстроки (original_title имеет больший приоритет)
-                    if clean_original_title and clean_original_title in clean_item_title:
-                        relevance_score = min(relevance_score, 2)
-                    elif clean_search_query and clean_search_query in clean_item_title:
-                        relevance_score = min(relevance_score, 3)
-
-                    # 4. Все слова из original_title присутствуют
-                    if clean_original_title:
-                        original_title_words = clean_original_title.split()
-                        if all(word in clean_item_title for word in original_title_words):
-                            relevance_score = min(relevance_score, 4)
-                    
-                    # 5. Все слова из search_query присутствуют
-                    if clean_search_query:
-                        search_query_words = clean_search_query.split()
-                        if all(word in clean_item_title for word in search_query_words):
-                            relevance_score = min(relevance_score, 5)
-
-                    # Если хоть какое-то совпадение (relevance_score не inf)
-                    if relevance_score != float('inf'):
-                        # Добавляем длину названия как множитель для дополнительной сортировки
-                        relevance_score += len(clean_item_title) * 0.01 
-                        
-                        try:
-                            price = float(item_price)
-                            found_products.append((relevance_score, item_title, item_link, price))
-                            seen_links.add(item_link) # Добавляем ссылку в множество
-                        except ValueError:
-                            logger.error(f"Ошибка преобразования цены '{item_price}' для товара '{item_title}'")
-                
-                # Сортируем найденные товары по оценке релевантности (чем меньше, тем лучше)
-                found_products.sort(key=lambda x: x[0])
-                
-                results = []
-                for _, title, link, price in found_products[:3]: # Берем до 3х самых релевантных
-                    results.append({
-                        'title': title,
-                        'link': link,
-                        'price': price
-                    })
-                    logger.info(f"Найден релевантный товар: '{title}' (Ссылка: {link}, Цена: {price})")
-                
-                if not results:
-                    logger.warning(f"Товары по запросам '{original_title}' и '{search_query}' не найдены на mieles.ru.")
-                
-                return results
-                
-        except aiohttp.ClientResponseError as e:
-            logger.error(f"Ошибка HTTP-ответа от mieles.ru: {e.status} - {e.message}")
-            return []
-        except aiohttp.ClientError as e:
-            logger.error(f"Ошибка сети при запросе к mieles.ru: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка при парсинге mieles.ru: {e}", exc_info=True)
-            return []
+
+                    candidate = (-relevance_score, item_title, item_link, price)
+                    if len(top_heap) < 3:
+                        _heappush(top_heap, candidate)
+                    elif candidate > top_heap[0]:
+                        _heapreplace(top_heap, candidate)
+                    _seen_add(item_link) # Добавляем ссылку в множество
+
+                    # Три точных совпадения (критерий 0) уже лучше всего,
+                    # что могут дать оставшиеся элементы, — выходим раньше
+                    if len(top_heap) == 3 and -top_heap[0][0] < 1.0:
+                        break
+
+            # Восстанавливаем порядок "лучшие первыми" из инвертированных оценок
+            results = []
+            for _, title, link, price in sorted(top_heap, reverse=True):
+                results.append({
+                    'title': title,
+                    'link': link,
+                    'price': price
+                })
+                logger.info("Найден релевантный товар: '%s' (Ссылка: %s, Цена: %s)", title, link, price)
+
+            if not results:
+                logger.warning(f"Товары по запросам '{original_title}' и '{search_query}' не найдены на mieles.ru.")
+
+            return results
+
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"Ошибка HTTP-ответа от mieles.ru: {e.status} - {e.message}")
+        return []
+    except aiohttp.ClientError as e:
+        logger.error(f"Ошибка сети при запросе к mieles.ru: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при парсинге mieles.ru: {e}", exc_info=True)
+        return []
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import logging
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from selectolax.lexbor import LexborHTMLParser
+
+from utils import (
+    build_search_terms,
+    extract_price_from_text,
+    fetch,
+    get_session,
+    normalize_and_clean,
+    normalize_text,
+    title_matches,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SiteConfig:
+    """
+    Описание одного HTML-магазина для общего конвейера parse_site.
+
+    Три парсера (Hausdorf, Miele-Unique, TehnikaPremium) отличаются только
+    URL поиска, CSS-селекторами и способом разбора цены — все оптимизации
+    (selectolax, слитая нормализация, ограниченная куча топ-3, ранний выход)
+    живут в одном месте и применяются ко всем сайтам сразу.
+    """
+    name: str                       # Имя сайта для логов
+    base: str                       # Базовый URL для достройки относительных ссылок
+    search_url: str                 # Шаблон URL поиска с плейсхолдером {query}
+    product_sel: str                # Селектор карточки товара
+    title_sel: str                  # Селектор названия (обычно несет и href)
+    price_sel: str                  # Селектор элемента с ценой
+    link_sel: Optional[str] = None  # Отдельный селектор ссылки, если href не в title_sel
+    article_sel: Optional[str] = None  # Селектор артикула (только TehnikaPremium)
+    # Требовать вхождения запроса целой фразой (title_matches) перед оценкой.
+    # Для поиска по артикулу (TehnikaPremium) фильтр выключен: артикул может
+    # совпасть, даже если запрос не встречается в названии.
+    require_phrase_match: bool = True
+    # Разбор текста цены; по умолчанию целочисленный extract_price_from_text,
+    # Hausdorf передает свой парсер с поддержкой дробной части
+    price_parser: Callable[[str], Optional[float]] = field(default=extract_price_from_text)
+
+
+def _abs(base: str, link: str) -> str:
+    """Быстрое построение абсолютной ссылки: hrefs каталогов либо уже
+    абсолютные, либо начинаются с '/', так что полный разбор URL
+    (urllib.parse.urljoin) в горячем цикле не нужен."""
+    if link.startswith('http'):
+        return link
+    if link.startswith('/'):
+        return base + link
+    return base + '/' + link
+
+
+async def parse_site(
+    cfg: SiteConfig,
+    original_title: str,
+    search_query: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    clean_original_title: Optional[str] = None,
+    clean_search_query: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Общий конвейер парсинга HTML-магазина: запрос страницы поиска,
+    извлечение товаров по селекторам из cfg в пуле потоков и возврат
+    до 3 наиболее релевантных уникальных позиций.
+
+    Args:
+        cfg (SiteConfig): Описание сайта (URL, селекторы, парсер цены).
+        original_title (str): Исходное, более полное название товара
+            (пустая строка, если сайт ищет только по search_query).
+        search_query (str): Сокращенный или основной поисковый запрос.
+        session (Optional[aiohttp.ClientSession]): Общая HTTP-сессия;
+            если не передана, берется ленивая сессия процесса (get_session()).
+        clean_original_title (Optional[str]): Уже нормализованное название (опционально).
+        clean_search_query (Optional[str]): Уже нормализованный запрос (опционально).
+
+    Returns:
+        List[Dict]: До 3 наиболее релевантных уникальных объектов
+                    {'title': str, 'link': str, 'price': float};
+                    при article_sel добавляются ключи 'score' и 'article'.
+    """
+    if session is None:
+        session = get_session()
+
+    encoded_query = urllib.parse.quote_plus(search_query)
+    search_url = cfg.search_url.format(query=encoded_query)
+
+    logger.info("Запрос к %s: %s", cfg.name, search_url)
+    html = await fetch(session, search_url)
+    if not html:
+        logger.error("Не удалось получить HTML-контент с %s по URL: %s", cfg.name, search_url)
+        return []
+
+    # Нормализуем запросы, если вызывающий код не передал готовые значения
+    if clean_original_title is None:
+        clean_original_title = normalize_and_clean(original_title)
+    if clean_search_query is None:
+        clean_search_query = normalize_and_clean(search_query)
+
+    # Кортеж поисковых терминов для проверки вхождения целым словом
+    search_terms = build_search_terms(clean_original_title, clean_search_query)
+
+    if not search_terms:
+        logger.warning("Поисковые запросы пусты после нормализации для %s.", cfg.name)
+        return []
+
+    logger.info("Поисковые термины для %s: %s", cfg.name, search_terms)
+
+    # Разбор HTML — чисто процессорная работа; выносим ее в поток из пула,
+    # чтобы не блокировать event loop для остальных обновлений Telegram.
+    # Возвращаются не более 3 лучших кандидатов, уже по возрастанию оценки.
+    found_products = await asyncio.to_thread(
+        _extract_products, cfg, html, search_terms, clean_original_title, clean_search_query
+    )
+
+    results = []
+    for score, title, link, price, article in found_products:
+        item = {
+            'title': title,
+            'link': link,
+            'price': price,
+        }
+        if cfg.article_sel is not None:
+            item['score'] = score
+            item['article'] = article
+        results.append(item)
+        logger.info("Выбран релевантный товар на %s: '%s' (Ссылка: %s, Цена: %s)", cfg.name, title, link, price)
+
+    if not results:
+        logger.warning("Товары по запросам '%s' и '%s' не найдены на %s.", original_title, search_query, cfg.name)
+
+    return results
+
+
+def _extract_products(
+    cfg: SiteConfig,
+    html: str,
+    search_terms: tuple,
+    clean_original_title: str,
+    clean_search_query: str,
+) -> List[Tuple[float, str, str, float, str]]:
+    """
+    Синхронный разбор HTML страницы поиска: извлекает товары по селекторам
+    из cfg, фильтрует по релевантности и считает оценку. Выполняется
+    в пуле потоков через asyncio.to_thread.
+
+    Возвращает не более 3 лучших кандидатов по возрастанию оценки
+    (score, title, link, price, article): вместо накопления и полной
+    сортировки всех совпадений поддерживается ограниченная куча размера 3
+    (кортежи с инвертированной оценкой).
+    """
+    # selectolax (биндинги lexbor) строит дерево на порядок быстрее bs4
+    # и почти не тратит память — разбор HTML здесь основная CPU-нагрузка
+    tree = LexborHTMLParser(html)
+
+    products = tree.css(cfg.product_sel)
+    if not products:
+        logger.warning("Товары не найдены на %s", cfg.name)
+        return []
+
+    # Инварианты цикла считаются один раз: truthiness запросов и их токены;
+    # проверка "все слова присутствуют" — issubset по множеству токенов названия
+    has_orig = bool(clean_original_title)
+    has_query = bool(clean_search_query)
+    original_title_words = frozenset(clean_original_title.split()) if has_orig else None
+    search_query_words = frozenset(clean_search_query.split()) if has_query else None
+
+    # Куча из максимум 3 элементов; оценка хранится со знаком минус,
+    # чтобы heapq (min-heap) вытеснял худшего кандидата
+    top_heap: List[Tuple[float, str, str, float, str]] = []
+    # Для дедупликации достаточно hash() ссылки — не храним сами строки
+    seen_links: set = set()
+
+    base = cfg.base
+    link_sel = cfg.link_sel
+    article_sel = cfg.article_sel
+    require_phrase = cfg.require_phrase_match
+
+    # Локальные псевдонимы горячих имен: LOAD_FAST вместо LOAD_GLOBAL/
+    # LOAD_ATTR на каждой итерации (словарные поиски уходят из цикла)
+    _norm_clean = normalize_and_clean
+    _matches = title_matches
+    _price = cfg.price_parser
+    _seen_add = seen_links.add
+    _heappush = heapq.heappush
+    _heapreplace = heapq.heapreplace
+
+    for product in products:
+        title_elem = product.css_first(cfg.title_sel)
+        if not title_elem:
+            continue
+
+        # text со склейкой через пробел дает тот же результат, что и ручной
+        # обход дочерних узлов, но без цикла на уровне Python
+        product_title = title_elem.text(separator=' ', strip=True)
+
+        # Ссылка обычно живет в том же элементе, что и название;
+        # отдельный селектор нужен только TehnikaPremium
+        link_elem = product.css_first(link_sel) if link_sel else title_elem
+        if not link_elem:
+            continue
+        product_link_relative = link_elem.attributes.get('href')
+        if not product_link_relative:
+            continue
+
+        product_link_full = _abs(base, product_link_relative)
+
+        # Проверяем уникальность ссылки ДО нормализации названия: дубликаты
+        # отсеиваются без лишней работы со строками. Ссылку запоминаем сразу,
+        # чтобы повторные вхождения отбрасывались независимо от релевантности.
+        link_hash = hash(product_link_full)
+        if link_hash in seen_links:
+            logger.debug("Пропускаем дубликат ссылки на %s: %s", cfg.name, product_link_full)
+            continue
+        _seen_add(link_hash)
+
+        clean_product_title = _norm_clean(product_title)
+        if not clean_product_title:
+            continue
+
+        # Фильтр вхождения запроса целой фразой; при поиске по артикулу
+        # он выключен — релевантность решает оценка ниже
+        if require_phrase and not _matches(clean_product_title, search_terms):
+            continue
+
+        article = ""
+        if article_sel is not None:
+            art_elem = product.css_first(article_sel)
+            if art_elem:
+                article = art_elem.text(strip=True).replace('Артикул:', '').strip()
+
+        price_elem = product.css_first(cfg.price_sel)
+        if not price_elem:
+            continue
+        price = _price(price_elem.text(strip=True))
+        if price is None:
+            continue
+
+        # Оценка релевантности (чем меньше, тем лучше)
+        relevance_score = float('inf')
+
+        # Приоритет точного совпадения артикула с запросом
+        if article and clean_search_query == normalize_text(article):
+            relevance_score = 0
+
+        # Приоритет точного совпадения названия
+        if has_orig and clean_original_title == clean_product_title:
+            relevance_score = min(relevance_score, 0)
+        elif has_query and clean_search_query == clean_product_title:
+            relevance_score = min(relevance_score, 1)
+
+        # Приоритет вхождения запроса в название
+        if has_orig and clean_original_title in clean_product_title:
+            relevance_score = min(relevance_score, 2)
+        elif has_query and clean_search_query in clean_product_title:
+            relevance_score = min(relevance_score, 3)
+
+        # Приоритет совпадения всех слов запроса в названии (как целых токенов)
+        if relevance_score == float('inf') and (original_title_words or search_query_words):
+            title_tokens = set(clean_product_title.split())
+            if original_title_words and original_title_words.issubset(title_tokens):
+                relevance_score = min(relevance_score, 4)
+            if search_query_words and search_query_words.issubset(title_tokens):
+                relevance_score = min(relevance_score, 5)
+
+        if relevance_score != float('inf'):
+            # Добавляем длину названия как мелкий фактор для сортировки
+            relevance_score += len(clean_product_title) * 0.01
+
+            candidate = (-relevance_score, product_title, product_link_full, price, article)
+            if len(top_heap) < 3:
+                _heappush(top_heap, candidate)
+            elif candidate > top_heap[0]:
+                _heapreplace(top_heap, candidate)
+            logger.debug("Найден потенциально релевантный товар на %s: '%s' (Цена: %s, Score: %s)", cfg.name, product_title, price, relevance_score)
+
+            # Три совпадения по сильнейшему критерию (0) уже не улучшить
+            # оставшимися карточками — выходим из цикла раньше
+            if len(top_heap) == 3 and -top_heap[0][0] < 1.0:
+                break
+
+    # Восстанавливаем исходные оценки и порядок "лучшие первыми"
+    return [
+        (-neg_score, title, link, price, article)
+        for neg_score, title, link, price, article in sorted(top_heap, reverse=True)
+    ]
@@ -1,71 +1,261 @@
 import asyncio
 import re
+import ssl
 import aiohttp
 import logging
-from typing import Optional
+import urllib.parse
+from functools import lru_cache
+from typing import Dict, Optional
+
+from aiohttp_client_cache import CachedSession, SQLiteBackend
 
 # Получаем логгер из общей конфигурации (предполагается, что конфиг установлен в config.py)
 # Если вы не используете config.py и настроили логирование напрямую в main.py,
 # то этот логгер будет использовать те настройки, которые были сделаны первыми.
 logger = logging.getLogger(__name__)
 
-async def fetch(session: aiohttp.ClientSession, url: str) -> Optional[str]:
+# TTL дискового кэша HTTP-ответов (6 часов)
+_CACHE_EXPIRE_AFTER = 21600
+
+# Единый таймаут для всех исходящих запросов: жесткие пределы на connect
+# и чтение сокета, чтобы один зависший сайт не задерживал весь gather
+# и не портил p95-латентность ответа пользователю
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3, sock_read=5)
+
+# Потолок размера ответа: страницы поиска укладываются в сотни КБ,
+# всё сильно большее — аномалия, которую не стоит парсить
+_MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+
+# Ограничиваем одновременные запросы К КАЖДОМУ ХОСТУ отдельно: всплеск
+# нагрузки на один сайт не блокирует запросы к остальным, а сами сайты
+# не получают лавину соединений, на которую отвечают ошибками и банами.
+_HOST_CONCURRENCY = 6
+_HOST_SEMAPHORES: Dict[str, asyncio.Semaphore] = {}
+
+def host_semaphore(url: str) -> asyncio.Semaphore:
+    """Возвращает семафор для хоста из URL, создавая его при первом обращении."""
+    host = urllib.parse.urlsplit(url).hostname or ""
+    sem = _HOST_SEMAPHORES.get(host)
+    if sem is None:
+        sem = _HOST_SEMAPHORES.setdefault(host, asyncio.Semaphore(_HOST_CONCURRENCY))
+    return sem
+
+# Один SSL-контекст на процесс: его создание (загрузка корневых сертификатов)
+# стоит дорого, а общий контекст позволяет переиспользовать TLS-сессии
+# при повторных соединениях с теми же хостами
+_SSL_CONTEXT = ssl.create_default_context()
+
+def create_http_session() -> CachedSession:
+    """
+    Создает общую HTTP-сессию для всех парсеров: один пул соединений
+    (keep-alive + DNS-кэш) вместо нового TCP/TLS-рукопожатия на каждый вызов,
+    плюс дисковый SQLite-кэш ответов с TTL.
+    Сессия создается один раз в main() и передается в парсеры;
+    закрывать ее нужно при остановке бота.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=10,
+        keepalive_timeout=75,
+        ttl_dns_cache=300,
+        ssl=_SSL_CONTEXT,
+        enable_cleanup_closed=True,
+    )
+    return CachedSession(
+        connector=connector,
+        timeout=HTTP_TIMEOUT,
+        cache=SQLiteBackend('http_cache.sqlite', expire_after=_CACHE_EXPIRE_AFTER),
+    )
+
+# Единственная на процесс HTTP-сессия; создается лениво при первом обращении.
+# Благодаря этому парсеры можно вызывать и без main() (скрипты, отладка),
+# не теряя пул соединений и keep-alive.
+_SESSION: Optional[CachedSession] = None
+
+def get_session() -> CachedSession:
+    """
+    Возвращает общую HTTP-сессию процесса, создавая ее при первом вызове.
+    Должна вызываться из работающего event loop.
+    """
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = create_http_session()
+    return _SESSION
+
+async def close_session() -> None:
+    """Закрывает общую HTTP-сессию при остановке приложения."""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+async def fetch(session: Optional[aiohttp.ClientSession], url: str) -> Optional[str]:
     """
     Асинхронно получает HTML-содержимое по заданному URL.
-    Увеличивает таймаут и добавляет User-Agent для обхода возможных блокировок.
+    Вместо session можно передать None — тогда берется общая ленивая
+    сессия процесса (get_session()), как и в самих парсерах.
+    Использует общий таймаут сессии (HTTP_TIMEOUT) и ограничивает размер
+    ответа, чтобы аномально большая страница не съела память и время.
     """
+    if session is None:
+        session = get_session()
     # Добавляем стандартный User-Agent, чтобы запрос выглядел как от браузера
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
         "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+        # Просим сжатые ответы: HTML страниц поиска ужимается в 3-5 раз,
+        # а aiohttp распаковывает их прозрачно (br — через пакет brotli)
+        "Accept-Encoding": "gzip, deflate, br",
     }
-    
+
     try:
-        # Увеличиваем таймаут до 30 секунд (можно настроить, если необходимо)
-        async with session.get(url, timeout=45, headers=headers) as response:
-            response.raise_for_status() # Вызывает исключение для статусов HTTP 4xx/5xx
-            return await response.text()
+        async with host_semaphore(url):
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status() # Вызывает исключение для статусов HTTP 4xx/5xx
+                # Отсекаем гигантские ответы до чтения тела. Потоковая проверка
+                # по чанкам несовместима с кэширующей сессией (тело нужно
+                # целиком для записи в кэш), поэтому ориентируемся на
+                # Content-Length, если сервер его прислал.
+                if response.content_length and response.content_length > _MAX_RESPONSE_BYTES:
+                    logger.error(
+                        f"Ответ {url} слишком большой ({response.content_length} байт), пропускаем"
+                    )
+                    return None
+                return await response.text()
     except aiohttp.ClientError as e:
         logger.error(f"Ошибка HTTP при запросе {url}: {e}")
         return None
     except asyncio.TimeoutError:
-        logger.error(f"Таймаут (30с) при запросе {url}")
+        logger.error(f"Таймаут ({HTTP_TIMEOUT.total}с) при запросе {url}")
         return None
     except Exception as e:
         logger.error(f"Неизвестная ошибка при получении {url}: {e}")
         return None
 
+# Таблица для замены 'ё' -> 'е' одним C-проходом через str.translate.
+# Прописная 'Ё' отдельно не нужна: нормализация всегда начинается
+# с .lower(), который уже приводит ее к строчной 'ё'.
+_YO_TABLE = str.maketrans({'ё': 'е'})
+
+# Предкомпилированные шаблоны для горячих текстовых утилит:
+# компиляция происходит один раз при импорте, а не при каждом вызове
+_PUNCT_RE = re.compile(r'[^a-z0-9а-я\s]')
+_WS_RE = re.compile(r'\s+')
+_MIELE_RE = re.compile(r'\bmiele\b', re.IGNORECASE)
+
+@lru_cache(maxsize=8192)
 def normalize_text(text: str) -> str:
     """
     Нормализует текстовую строку: приводит к нижнему регистру,
     удаляет лишние пробелы и знаки препинания, заменяет 'ё' на 'е'.
+    Результаты кэшируются: названия товаров повторяются между страницами
+    и запросами пользователей.
     """
-    text = text.lower()
-    text = text.replace('ё', 'е')
+    text = text.lower().translate(_YO_TABLE)
     # Удаляем все, кроме букв, цифр и пробелов
-    text = re.sub(r'[^a-z0-9а-я\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _PUNCT_RE.sub('', text)
+    text = _WS_RE.sub(' ', text).strip()
     return text
 
+# Слитый шаблон для normalize_and_clean: за один проход удаляет и слово
+# 'miele' целиком, и все символы, кроме букв/цифр/пробелов. От старой
+# цепочки remove_miele(normalize_text(...)) намеренно отличается на
+# склеенных пунктуацией формах: 'Miele-G7310' дает 'g7310', а не
+# 'mieleg7310' — граница \b видит бренд до того, как пунктуация исчезнет,
+# и именно на это поведение опирается оценка релевантности
+_CLEAN_RE = re.compile(r'\bmiele\b|[^a-z0-9а-я\s]+')
+
+@lru_cache(maxsize=8192)
+def normalize_and_clean(text: str) -> str:
+    """
+    Объединяет normalize_text и remove_miele в один проход по строке:
+    нижний регистр, 'ё' -> 'е', затем одна regex-замена убирает и слово
+    'miele', и знаки препинания, после чего схлопываются пробелы.
+    Использовать в горячих циклах парсеров вместо цепочки из двух хелперов.
+    """
+    text = text.lower().translate(_YO_TABLE)
+    text = _CLEAN_RE.sub('', text)
+    return _WS_RE.sub(' ', text).strip()
+
+@lru_cache(maxsize=8192)
 def remove_miele(text: str) -> str:
     """
     Удаляет слово 'Miele' (и его вариации) из строки, игнорируя регистр.
+    Результаты кэшируются по той же причине, что и у normalize_text:
+    одни и те же названия и запросы обрабатываются многократно.
     """
-    text = re.sub(r'\bmiele\b', '', text, flags=re.IGNORECASE)
-    return re.sub(r'\s+', ' ', text).strip()
+    text = _MIELE_RE.sub('', text)
+    return _WS_RE.sub(' ', text).strip()
+
+@lru_cache(maxsize=1024)
+def build_search_terms(clean_original_title: str, clean_search_query: str) -> tuple:
+    """
+    Собирает кортеж поисковых терминов для title_matches из пары
+    нормализованных запросов (пустые и совпадающие значения отбрасываются).
+    Раньше каждый парсер строил такой список (а до того — одинаковый regex)
+    заново на каждый вызов; мемоизация по паре запросов делает это один раз
+    на уникальный запрос пользователя, сколько бы сайтов его ни обрабатывало.
+    """
+    terms = []
+    if clean_original_title:
+        terms.append(clean_original_title)
+    if clean_search_query and clean_search_query != clean_original_title:
+        terms.append(clean_search_query)
+    return tuple(terms)
+
+def title_matches(clean_title: str, search_terms) -> bool:
+    """
+    Проверяет, содержит ли нормализованное название хотя бы один из поисковых
+    терминов как целое слово (границы — не-буквенно-цифровые символы или края
+    строки). Линейное сканирование подстрок вместо регулярного выражения:
+    при одном-двух терминах это эквивалент многошаблонного автомата
+    (Ахо-Корасик) без затрат на построение и без regex-движка в горячем цикле.
+    Порог целесообразности: при десятках и более терминов на запрос выгоднее
+    собрать настоящий многошаблонный автомат (pyahocorasick/hyperscan) один
+    раз и сканировать им все названия; при нынешних 1-2 терминах стоимость
+    компиляции базы шаблонов не окупается.
+    Обе стороны должны быть уже нормализованы (normalize_text).
+    """
+    title_len = len(clean_title)
+    for term in search_terms:
+        start = 0
+        term_len = len(term)
+        while True:
+            idx = clean_title.find(term, start)
+            if idx == -1:
+                break
+            end = idx + term_len
+            boundary_before = idx == 0 or not clean_title[idx - 1].isalnum()
+            boundary_after = end == title_len or not clean_title[end].isalnum()
+            if boundary_before and boundary_after:
+                return True
+            start = idx + 1
+    return False
+
+# Таблица для быстрого пути extract_price_from_text: одним C-проходом
+# удаляет типичный "мусор" ценников (пробелы, неразрывные пробелы, разделители
+# разрядов, знак рубля и подпись "руб."). Если после очистки остались только
+# цифры, regex-движок вообще не нужен.
+_PRICE_TABLE = str.maketrans('', '', ' \xa0\u202f.,₽рубРУБ')
 
 def extract_price_from_text(price_text: str) -> Optional[int]:
     """
     Извлекает целое число цены из строки.
-    Удаляет все нецифровые символы и пытается преобразовать оставшуюся строку в int.
+    Сначала пробует быстрый путь: str.translate удаляет известные нецифровые
+    символы за один проход; если остались только цифры — готово.
+    Иначе оставляет только цифры генератором по символам — str.isdigit
+    и str.join работают в C, без запуска regex-движка (семантика та же,
+    что у прежнего re.sub(r'[^\d]', '', ...)).
     Пример: "12 345 руб." -> 12345
     """
-    # Используем регулярное выражение для удаления всего, что не является цифрой
-    cleaned_price_str = re.sub(r'[^\d]', '', price_text)
+    cleaned_price_str = price_text.translate(_PRICE_TABLE)
+    if not cleaned_price_str.isdigit():
+        # В строке встретилось что-то незнакомое — фильтруем посимвольно
+        cleaned_price_str = ''.join(ch for ch in price_text if ch.isdigit())
     try:
         price = int(cleaned_price_str)
         return price
     except ValueError:
-        logger.warning(f"Не удалось извлечь цену из текста: '{price_text}'")
+        logger.warning("Не удалось извлечь цену из текста: '%s'", price_text)
         return None
\ No newline at end of file